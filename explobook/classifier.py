@@ -1,21 +1,15 @@
-import functools
-import itertools
-from typing import List, Optional, Callable
-
-from explobook.model import Page, Line, calculate_box, TableText, Paragraph, Listing, \
-    Header, Document, fix_word_breaks, is_bold, is_medium, format_text
-
-FONTS = [
-    "Black",
-    "Bold",
-    "BoldItalic",
-    "Book",
-    "BookItalic"
-    "Medium",
-    "MediumItalic",
-    "Normal",
-    "NormalItalic",
-]
+from typing import List, Optional, Tuple, Union
+
+from explobook.model import Page, Line, Word, calculate_box, Paragraph, Listing, \
+    Header, Document, FormattedText, fix_word_breaks, is_bold, is_medium, format_text, \
+    font_flags, BOLD, MEDIUM
+
+_OL_LUT = bytearray(128)
+for _digit in b'0123456789':
+    _OL_LUT[_digit] = 1
+_UL_SET = frozenset('-*#>•')
+
+Element = Union[Header, Listing, Paragraph]
 
 
 def classify(page: Page) -> Document:
@@ -25,116 +19,128 @@ def classify(page: Page) -> Document:
     return Document(items, page.tables)
 
 
-def classify_tables(tables: List[TableText]):
-    pass
-
-
-def classify_lines(lines: List[Line]) -> List:
-    if not lines:
-        return lines
-    if header := try_header(lines):
-        return header
-    elif ol := try_ol(lines):
-        return ol
-    elif ul := try_ul(lines):
-        return ul
-    else:
-        return paragraph(lines)
+_Frame = Tuple[List[Line], List[Word], List[float], List[bool], List[bool]]
+
+
+def _index(lines: List[Line]) -> _Frame:
+    first_words = [line.first_word for line in lines]
+    x0s = [line.first_x0 for line in lines]
+    first_texts = [word['text'] for word in first_words]
+    ol_starts = [_is_ol(text) for text in first_texts]
+    ul_starts = [_is_ul(text) for text in first_texts]
+    return lines, first_words, x0s, ol_starts, ul_starts
+
+
+def _slice(frame: _Frame, start: int, end: Optional[int]) -> _Frame:
+    lines, first_words, x0s, ol_starts, ul_starts = frame
+    return (lines[start:end], first_words[start:end], x0s[start:end],
+            ol_starts[start:end], ul_starts[start:end])
+
+
+def classify_lines(lines: List[Line]) -> List[Element]:
+    items: List[Element] = []
+    # lines are indexed once, the remaining lines are pushed back with their slice of the index
+    work: List[Union[_Frame, Header, Listing]] = [_index(lines)]
+    while work:
+        frame = work.pop()
+        if not isinstance(frame, tuple):
+            items.append(frame)
+            continue
+        chunk, first_words, x0s, ol_starts, ul_starts = frame
+        if not chunk:
+            continue
+        if first_words[0]['size'] >= 10 and (found := try_header(chunk, first_words)):
+            header, _ = found
+            work.extend([_slice(frame, 1, None), header])
+        elif any(ol_starts):
+            listing, no_items = try_ol(chunk, ol_starts)
+            work.extend([listing, _slice(frame, 0, len(no_items))])
+        elif any(ul_starts):
+            listing, no_items = try_ul(chunk, ul_starts)
+            work.extend([listing, _slice(frame, 0, len(no_items))])
+        else:
+            items.extend(paragraph(chunk, x0s))
+    return items
 
 
-def paragraph(lines: List[Line]):
-    if not lines:
-        return None
-    min_indent = min(line.words[0]['x0'] for line in lines)
+def paragraph(lines: List[Line], x0s: List[float]) -> List[Paragraph]:
+    min_indent = min(x0s)
     if min_indent >= 120:
         return [create_paragraph(lines)]
     else:
-        return grouped_paragraphs(min_indent, lines)
+        return grouped_paragraphs(min_indent, lines, x0s)
 
 
 def create_paragraph(lines: List[Line]) -> Paragraph:
     box = calculate_box(lines)
     fix_word_breaks(lines)
-    words = list(itertools.chain(*[line.words for line in lines]))
+    words = [word for line in lines for word in line.words]
     return Paragraph(format_text(words), box)
 
 
-def grouped_paragraphs(min_indent: float, lines: List[Line]) -> List[Paragraph]:
-    def group(paragraphs: List[List[Line]], line: Line) -> List[List[Line]]:
-        if not paragraphs:
-            return [[line]]
-        indent = line.words[0]['x0']
-        if indent >= min_indent + 2:
-            paragraphs.append([line])
+def grouped_paragraphs(min_indent: float, lines: List[Line], x0s: List[float]) -> List[Paragraph]:
+    paragraphs: List[List[Line]] = []
+    current = None
+    threshold = min_indent + 2
+    for line, x0 in zip(lines, x0s):
+        if current is None or x0 >= threshold:
+            current = [line]
+            paragraphs.append(current)
         else:
-            paragraphs[-1].append(line)
-        return paragraphs
-
-    paragraphs_grouped = functools.reduce(group, lines, [])
-    return [create_paragraph(p_lines) for p_lines in paragraphs_grouped]
+            current.append(line)
+    return [create_paragraph(p_lines) for p_lines in paragraphs]
 
 
-def is_unordered_list_item(line):
-    first_word: str = line.words[0]['text']
-    return first_word[0] in '-*#>•'
+def _is_ul(first_text: str) -> bool:
+    return first_text[:1] in _UL_SET
 
 
-def is_ordered_list_item(line):
-    first_word: str = line.words[0]['text']
-    if len(first_word) == 1:
+def _is_ol(first_text: str) -> bool:
+    if len(first_text) < 2:
         return False
-    return first_word[0].isnumeric() and not first_word[1].isalpha()
+    code = ord(first_text[0])
+    return code < 128 and _OL_LUT[code] == 1 and not first_text[1].isalpha()
 
 
-def try_ol(lines: List[Line]) -> List:
-    return try_list(lines, is_ordered_list_item, 'ordered')
+def try_ol(lines: List[Line], ol_starts: List[bool]) -> Tuple[Listing, List[Line]]:
+    return try_list(lines, ol_starts, 'ordered')
 
 
-def try_ul(lines):
-    return try_list(lines, is_unordered_list_item, 'unordered')
+def try_ul(lines: List[Line], ul_starts: List[bool]) -> Tuple[Listing, List[Line]]:
+    return try_list(lines, ul_starts, 'unordered')
 
 
-def try_list(lines: List[Line], starts_item: Callable[[Line], bool], kind: str) -> Optional[List]:
-    ordered = [line for line in lines if starts_item(line)]
-    if not ordered:
-        return None
-    ol = group_list_items(lines, ordered)
-
-    items = list(itertools.chain(*ol))
-    no_items = [line for line in lines if line not in items]
+def try_list(lines: List[Line], item_starts: List[bool], kind: str) -> Tuple[Listing, List[Line]]:
+    first_item = item_starts.index(True)
+    no_items = lines[:first_item]
+    ol = group_list_items(lines[first_item:], item_starts[first_item:])
 
     list_items, box = tokenize_list(ol)
     listing = Listing(kind, list_items, box)
-    return [*classify_lines(no_items), listing]
+    return listing, no_items
 
 
-def tokenize_list(ol: List[List[Line]]):
+def tokenize_list(ol: List[List[Line]]) -> Tuple[List[List[FormattedText]], List[float]]:
+    box = calculate_box([line for item in ol for line in item])
     items = []
     for item in ol:
         fix_word_breaks(item)
-        words = list(itertools.chain(*[line.words for line in item]))
+        words = [word for line in item for word in line.words]
         items.append(format_text(words))
-    box = calculate_box(list(itertools.chain(*ol)))
     return items, box
 
 
-def group_list_items(lines: List[Line], list_item_start: List[Line]) -> List[List[Line]]:
+def group_list_items(lines: List[Line], item_starts: List[bool]) -> List[List[Line]]:
     ol = []
-    item = []
-    for line in lines:
-        if line in list_item_start:
-            item = [line]
-            ol.append(item)
+    for line, start in zip(lines, item_starts):
+        if start:
+            ol.append([line])
         else:
-            item.append(line)
+            ol[-1].append(line)
     return ol
 
 
-def header_level(line: Line) -> str:
-    first_word = line.words[0]
-    size = first_word['size']
-    bold = is_bold(first_word)
-    medium = is_medium(first_word)
+def header_level(size: float, bold: bool, medium: bool) -> str:
     if bold and size > 20:
         return 'h1'
     elif medium and size > 10:
@@ -143,33 +149,30 @@ def header_level(line: Line) -> str:
         return 'h3'
 
 
-def classify_header(line: Line):
-    level = header_level(line)
+def classify_header(line: Line, size: float, bold: bool, medium: bool) -> Header:
+    level = header_level(size, bold, medium)
     text = format_text(line.words)
     box = calculate_box([line])
     return Header(level, text, box)
 
 
 def is_all_caps(line: Line) -> bool:
-    for word in line.words:
-        for character in word['text']:
-            if character.isalpha():
-                if character.islower():
-                    return False
-    return True
+    return all(word['text'] == word['text'].upper() for word in line.words)
 
 
-def try_header(lines: List[Line]) -> Optional[List[Header]]:
+def try_header(lines: List[Line], first_words: List[Word]) -> Optional[Tuple[Header, List[Line]]]:
     if not lines:
         return None
     first_line, rest = lines[0], lines[1:]
-    first_word = first_line.words[0]
+    first_word = first_words[0]
     size = first_word['size']
-    medium = size == 10 and all([is_medium(word) or is_bold(word) for word in first_line.words])
-    big = is_all_caps(first_line) and size >= 10 and (is_bold(first_word) or is_medium(first_word))
-    if not big and not medium:
+    flags = font_flags(first_word)
+    bold = bool(flags & BOLD)
+    medium = bool(flags & MEDIUM)
+    medium_header = size == 10 and all(is_medium(word) or is_bold(word) for word in first_line.words)
+    big_header = size >= 10 and (bold or medium) and is_all_caps(first_line)
+    if not big_header and not medium_header:
         return None
-    header = classify_header(first_line)
-    return [header, *classify_lines(rest)] if rest else [header]
+    return classify_header(first_line, size, bold, medium), rest
 
 
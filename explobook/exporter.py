@@ -1,30 +1,42 @@
+import io
 import os.path
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Iterable, Iterator
 
 from explobook.model import Document
 
 
-def group_chapters(documents: List[Document]) -> List[List[Document]]:
-    chapters = []
+def iter_chapters(documents: Iterable[Document]) -> Iterator[List[Document]]:
+    chapter = None
     for document in documents:
         if not document.all_elements():
             continue
         has_title = any(header for header in document.headers() if header.level == 'h1')
-        if has_title or not chapters:
-            chapters.append([document])
+        if has_title or chapter is None:
+            if chapter is not None:
+                yield chapter
+            chapter = [document]
         else:
-            chapters[-1].append(document)
-    return chapters
+            chapter.append(document)
+    if chapter is not None:
+        yield chapter
+
+
+def group_chapters(documents: Iterable[Document]) -> List[List[Document]]:
+    return list(iter_chapters(documents))
 
 
 def chapter_title(chapter: List[Document]):
-    return chapter[0].headers()[0].text()
+    return chapter[0].headers()[0].text
 
 
-def export(out: str, documents: List[Document]):
-    chapters = group_chapters(documents)
-    for index, chapter in enumerate(chapters):
-        to_html(out, chapter, index)
+def export(out: str, documents: Iterable[Document]):
+    os.makedirs(out, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=4) as writer:
+        futures = [writer.submit(to_html, out, chapter, index)
+                   for index, chapter in enumerate(iter_chapters(documents))]
+    for future in futures:
+        future.result()
 
 
 def to_html(out: str, chapter: List[Document], index):
@@ -33,16 +45,16 @@ def to_html(out: str, chapter: List[Document], index):
     file_name = f'{index_name}-{title}.html'
     print(f'Processing chapter {file_name}')
     file_path = os.path.join(out, file_name)
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, 'w') as html:
-        html.writelines([
-            '<!doctype html>'
-            '<html lang="es">'
-            '<head>'
-            '<meta charset="UTF-8">'
-            '</head>'
-            '<body>'])
-        for doc in chapter:
-            html.write(doc.to_html())
-        html.write('</body>')
-        html.write('</html>')
+    buf = io.StringIO()
+    buf.write('<!doctype html>'
+              '<html lang="es">'
+              '<head>'
+              '<meta charset="UTF-8">'
+              '</head>'
+              '<body>')
+    for doc in chapter:
+        doc.write_html(buf)
+    buf.write('</body>'
+              '</html>')
+    with open(file_path, 'w', buffering=1 << 16) as html:
+        html.write(buf.getvalue())
@@ -1,12 +1,15 @@
-import functools
+import atexit
 import itertools
+import json
 import os.path
-from typing import List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import pdfplumber
 import yaml
 from pdfplumber.display import PageImage
 from pdfplumber.page import Page
+from pdfplumber.pdf import PDF
 from pdfplumber.table import Table
 
 from explobook import model
@@ -14,6 +17,8 @@ from explobook.classifier import classify
 from explobook.exporter import export
 from explobook.model import Word, Line, Section, TableText, Cell, Row, Document
 
+YAML_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
 
 def crop(page: Page):
     return page.crop((85, 132, 520, 645))
@@ -24,38 +29,90 @@ def extract_words(page: Page) -> List[Word]:
 
 
 def normalize(words: List[Word]) -> List[Word]:
-    return [Word(**{**word,
-                    'size': int(word['size']),
-                    'x0': int(word['x0']),
-                    'x1': int(word['x1']),
-                    'bottom': int(word['bottom']),
-                    'top': int(word['top'])})
-            for word in words]
-
-
-def extract(path: str, out: str, pages: Optional[List[int]] = None):
-    documents = []
-    with pdfplumber.open(path) as pdf:
-        pages_to_fetch = pages if pages else range(len(pdf.pages))
-        for page_number in pages_to_fetch:
-            print(f'Processing page {str(page_number).ljust(3, "0")}')
-            page = pdf.pages[page_number]
-            document = parse_page(page)
-            # print_classification(page, document, out)
-            documents.append(document)
+    for word in words:
+        word['size'] = int(word['size'])
+        word['x0'] = int(word['x0'])
+        word['x1'] = int(word['x1'])
+        word['bottom'] = int(word['bottom'])
+        word['top'] = int(word['top'])
+    return words
+
+
+def extract(path: str, out: str, pages: Optional[List[int]] = None, debug: bool = False,
+            dump: Optional[str] = None):
+    if pages:
+        pages_to_fetch: Sequence[int] = pages
+    else:
+        with pdfplumber.open(path) as pdf:
+            pages_to_fetch = range(len(pdf.pages))
+    os.makedirs(out, exist_ok=True)
+    if debug:
+        os.makedirs(os.path.join(out, "debug"), exist_ok=True)
+    model_pages: List[model.Page] = []
+    if len(pages_to_fetch) == 1:
+        # a single page is not worth starting a pool
+        with pdfplumber.open(path) as pdf:
+            result = process_page(pdf, pages_to_fetch[0], out, debug, dump is not None)
+        export(out, _collect_pages([result], model_pages))
+    else:
+        workers = min(os.cpu_count() or 1, len(pages_to_fetch))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_open_pdf,
+                                 initargs=(path, out, debug, dump is not None)) as executor:
+            results = executor.map(_process_page, pages_to_fetch)
             # save_document(page.page_number, document, out)
-            # save_page(p, out)
-            # print_image(cropped, p, out)
-            # print_classification(cropped, document, out)
-    export(out, documents)
+            export(out, _collect_pages(results, model_pages))
+    if dump:
+        PAGE_DUMPS[dump](model_pages, out)
 
 
-def parse_page(page) -> Document:
+def _collect_pages(results: Iterable[Tuple[Document, Optional[model.Page]]],
+                   model_pages: List[model.Page]) -> Iterator[Document]:
+    for document, model_page in results:
+        if model_page is not None:
+            model_pages.append(model_page)
+        yield document
+
+
+_worker_pdf: Optional[PDF] = None
+_worker_out = ''
+_worker_debug = False
+_worker_dump = False
+
+
+def _open_pdf(path: str, out: str, debug: bool, dump: bool):
+    global _worker_pdf, _worker_out, _worker_debug, _worker_dump
+    _worker_pdf = pdfplumber.open(path)
+    atexit.register(_worker_pdf.close)
+    _worker_out = out
+    _worker_debug = debug
+    _worker_dump = dump
+
+
+def _process_page(page_number: int) -> Tuple[Document, Optional[model.Page]]:
+    assert _worker_pdf is not None, "_open_pdf initializes every worker"
+    return process_page(_worker_pdf, page_number, _worker_out, _worker_debug, _worker_dump)
+
+
+def process_page(pdf: PDF, page_number: int, out: str, debug: bool,
+                 dump: bool) -> Tuple[Document, Optional[model.Page]]:
+    print(f'Processing page {str(page_number).ljust(3, "0")}')
+    page = pdf.pages[page_number]
+    # print_image(cropped, p, out)
+    model_page = extract_page(page)
+    document = classify(model_page)
+    if debug:
+        print_classification(crop(page), document, out)
+    return document, model_page if dump else None
+
+
+def extract_page(page) -> model.Page:
     cropped = crop(page)
     (tables, sections) = extract_text(cropped)
-    p = model.Page(page.page_number, sections, tables)
-    document = classify(p)
-    return document
+    return model.Page(page.page_number, sections, tables)
+
+
+def parse_page(page) -> Document:
+    return classify(extract_page(page))
 
 
 def save_document(page_number: int, document: Document, out: str):
@@ -63,80 +120,92 @@ def save_document(page_number: int, document: Document, out: str):
     filepath = os.path.join(out, "classification", name)
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
     with open(filepath, 'w') as file:
-        yaml.dump([h.as_dict() for h in document.headers()], file)
+        yaml.dump([h.as_dict() for h in document.headers()], file, Dumper=YAML_DUMPER)
 
 
-def print_classification(page: Page, document: Document, out: str):
+def to_bbox(box: List) -> Tuple:
+    # calculate_box returns [x0, bottom, x1, top], pdfplumber draws (x0, top, x1, bottom)
+    x0, bottom, x1, top = box
+    return x0, top, x1, bottom
+
+
+def print_classification(page: Page, document: Document, out: str, resolution: int = 72):
     name = str(page.page_number).rjust(3, "0") + ".jpeg"
     filepath = os.path.join(out, "debug", name)
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    with open(filepath, 'w') as file:
-        img: PageImage = page.to_image(resolution=150)
-        headers = [header.box for header in document.headers()]
+    with open(filepath, 'wb') as file:
+        img: PageImage = page.to_image(resolution=resolution)
+        headers = [to_bbox(header.box) for header in document.headers()]
         img.draw_rects(headers, fill=ORANGE)
-        ols = [ol.box for ol in document.ordered_lists()]
+        ols = [to_bbox(ol.box) for ol in document.ordered_lists()]
         img.draw_rects(ols, fill=YELLOW)
-        lists = [ol.box for ol in document.lists()]
+        lists = [to_bbox(ol.box) for ol in document.lists()]
         img.draw_rects(lists, fill=RED)
-        p = [ol.box for ol in document.paragraphs()]
+        p = [to_bbox(ol.box) for ol in document.paragraphs()]
         img.draw_rects(p)
         img.save(file)
 
 
-def parse_table(page: Page, table: Table) -> TableText:
+def within(word: Word, bbox: Tuple) -> bool:
+    x0, top, x1, bottom = bbox
+    center_x = (word['x0'] + word['x1']) / 2
+    center_y = (word['top'] + word['bottom']) / 2
+    return x0 <= center_x < x1 and top <= center_y < bottom
+
+
+def parse_table(table: Table, words: List[Word]) -> TableText:
+    table_words = [word for word in words if within(word, table.bbox)]
     rows = []
     for row in table.rows:
         table_row = []
         for cell in row.cells:
             if not cell:
                 continue
-            cell_boundaries = page.within_bbox(cell)
-            words = extract_words(cell_boundaries)
-            lines = group_lines(words)
+            cell_words = [word for word in table_words if within(word, cell)]
+            lines = group_lines(cell_words)
             sections = group_sections(lines)
             table_row.append(Cell(sections))
         rows.append(Row(table_row))
     return TableText(rows, table.bbox)
 
 
-def extract_tables(page: Page) -> List[TableText]:
-    return [parse_table(page, table)
-            for table in page.find_tables()]
+def extract_tables(tables: List[Table], words: List[Word]) -> List[TableText]:
+    return [parse_table(table, words)
+            for table in tables]
 
 
-def remove_tables(page: Page) -> List[Word]:
-    words = extract_words(page)
-    tables = page.find_tables()
-    for table in tables:
-        table_words = extract_words(page.within_bbox(table.bbox))
-        for word in table_words:
-            if word in words:
-                words.remove(word)
-    return words
+def find_tables(page: Page) -> List[Table]:
+    if not (page.rects or page.lines or page.curves):
+        return []
+    return page.find_tables()
+
+
+def remove_tables(words: List[Word], tables: List[Table]) -> List[Word]:
+    boxes = [table.bbox for table in tables]
+    return [word for word in words if not any(within(word, box) for box in boxes)]
 
 
 def extract_text(page: Page) -> Tuple[List[TableText], List[Section]]:
-    tables = extract_tables(page)
-    words = remove_tables(page)
+    words = extract_words(page)
+    tables = find_tables(page)
+    table_texts = extract_tables(tables, words)
+    words = remove_tables(words, tables)
     lines = group_lines(words)
     sections = group_sections(lines)
-    return tables, sections
+    return table_texts, sections
 
 
-def group_lines(words: List[Word]) -> List[Line]:
-    def group_by_baseline(lines: List[List[Word]], word: Word) -> List[List[Word]]:
-        if not lines:
-            return [[word]]
-        line = lines[-1]
-        baseline = line[-1]['bottom']
-        if abs(baseline - word['bottom']) <= 1:
-            line.append(word)
-        else:
-            lines.append([word])
-        return lines
+def split_at(items: List, cuts: List[int]) -> List[List]:
+    bounds = [0, *cuts, len(items)]
+    return [items[start:end] for start, end in zip(bounds, bounds[1:])]
 
-    lines = functools.reduce(group_by_baseline, words, [])
-    return [Line(line) for line in lines]
+
+def group_lines(words: List[Word]) -> List[Line]:
+    if not words:
+        return []
+    bottoms = [word['bottom'] for word in words]
+    cuts = [index for index, (previous, bottom) in enumerate(zip(bottoms, bottoms[1:]), 1)
+            if abs(previous - bottom) > 1]
+    return [Line(line) for line in split_at(words, cuts)]
 
 
 def get_fonts(line):
@@ -144,35 +213,40 @@ def get_fonts(line):
     return [font[0] for font in fonts]
 
 
-def line_separation(top_line: Line, bottom_line: Line) -> float:
-    bottom = top_line.words[0]['bottom']
-    top = bottom_line.words[0]['top']
-    return top - bottom
-
-
-def detect_sections(group: List[List[Line]], line: Line) -> List[List[Line]]:
-    if not group:
-        return [[line]]
-    paragraph = group[-1]
-    last_line = paragraph[-1]
-    if line_separation(last_line, line) <= 2:
-        paragraph.append(line)
-    else:
-        group.append([line])
-    return group
-
-
 def group_sections(lines: List[Line]) -> List[Section]:
-    sections: List[List[Line]] = functools.reduce(detect_sections, lines, [])
+    sections: List[List[Line]] = []
+    current = None
+    for line in lines:
+        if current is not None and line.first_top - current[-1].first_bottom <= 2:
+            current.append(line)
+        else:
+            current = [line]
+            sections.append(current)
     return [Section(section) for section in sections]
 
 
 def save_page(page: model.Page, out: str):
     name = str(page.number).rjust(3, "0") + ".yaml"
     filepath = os.path.join(out, name)
+    with open(filepath, 'w') as file:
+        yaml.dump(page.as_dict(), file, Dumper=YAML_DUMPER)
+
+
+def save_pages(pages: List[model.Page], out: str):
+    filepath = os.path.join(out, "pages.yaml")
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
     with open(filepath, 'w') as file:
-        yaml.dump(page.as_dict(), file)
+        yaml.dump_all([page.as_dict() for page in pages], file, Dumper=YAML_DUMPER)
+
+
+def save_pages_jsonl(pages: List[model.Page], out: str):
+    filepath = os.path.join(out, "pages.jsonl")
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, 'w') as file:
+        file.writelines(json.dumps(page.as_dict(), ensure_ascii=False) + '\n' for page in pages)
+
+
+PAGE_DUMPS = {'yaml': save_pages, 'jsonl': save_pages_jsonl}
 
 
 GREEN = (0, 255, 0, 50)
@@ -181,12 +255,11 @@ YELLOW = (255, 255, 0, 50)
 RED = (255, 0, 0, 50)
 
 
-def print_image(page, model_page: model.Page, out: str):
+def print_image(page, model_page: model.Page, out: str, resolution: int = 72):
     name = str(model_page.number).rjust(3, "0") + ".jpeg"
     filepath = os.path.join(out, name)
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    with open(filepath, 'w') as file:
-        img: PageImage = page.to_image(resolution=150)
-        img.draw_rects([section.box() for section in model_page.sections])
-        img.draw_rects([table.box() for table in model_page.tables], fill=GREEN)
+    with open(filepath, 'wb') as file:
+        img: PageImage = page.to_image(resolution=resolution)
+        img.draw_rects([to_bbox(section.box()) for section in model_page.sections])
+        img.draw_rects([table.box for table in model_page.tables], fill=GREEN)
         img.save(file)
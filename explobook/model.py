@@ -1,5 +1,7 @@
-import itertools
-from typing import TypedDict, List, Tuple, Union
+import functools
+import io
+import re
+from typing import TypedDict, List, Optional, Tuple, Union, Dict, TextIO
 
 
 class Word(TypedDict):
@@ -18,17 +20,28 @@ class Word(TypedDict):
 class Line:
     def __init__(self, words: List[Word]):
         self.words = words
-
+        self.refresh_bounds()
+
+    def refresh_bounds(self):
+        first_word = self.words[0] if self.words else None
+        self.first_word = first_word
+        self.first_x0 = first_word['x0'] if first_word else None
+        self.first_top = first_word['top'] if first_word else None
+        self.first_bottom = first_word['bottom'] if first_word else None
+        self.last_x1 = self.words[-1]['x1'] if self.words else None
+        self.__dict__.pop('text', None)
+
+    @functools.cached_property
     def text(self):
         return " ".join([word['text'] for word in self.words])
 
     def as_dict(self):
         return {'kind': 'line',
-                'text': self.text(),
-                'words': [word for word in self.words]}
+                'text': self.text,
+                'words': self.words}
 
     def __str__(self):
-        return self.text()
+        return self.text
 
 
 class Section:
@@ -38,12 +51,13 @@ class Section:
     def box(self):
         return calculate_box(self.lines)
 
+    @property
     def text(self):
-        return " ".join([line.text() for line in self.lines])
+        return " ".join([line.text for line in self.lines])
 
     def as_dict(self):
         return {'kind': 'section',
-                'text': self.text(),
+                'text': self.text,
                 'lines': [line.as_dict() for line in self.lines]}
 
 
@@ -51,18 +65,19 @@ class Cell:
     def __init__(self, sections: List[Section]):
         self.sections = sections
 
+    @property
     def text(self):
-        return " ".join([section.text() for section in self.sections])
+        return " ".join([section.text for section in self.sections])
 
     def as_dict(self):
         return {'kind': 'cell',
-                'text': self.text(),
+                'text': self.text,
                 'sections': [section.as_dict() for section in self.sections]}
 
     def to_html(self):
-        lines = list(itertools.chain(*[section.lines for section in self.sections]))
+        lines = [line for section in self.sections for line in section.lines]
         fix_word_breaks(lines)
-        words = list(itertools.chain(*[line.words for line in lines]))
+        words = [word for line in lines for word in line.words]
         formatted = [text.to_html() for text in format_text(words)]
         return wrap_tag('td', " ".join(formatted))
 
@@ -71,17 +86,25 @@ class Row:
     def __init__(self, cells: List[Cell]):
         self.cells = cells
 
+    @property
     def text(self):
-        return " | ".join([cell.text() for cell in self.cells])
+        return " | ".join([cell.text for cell in self.cells])
 
     def as_dict(self):
         return {'kind': 'row',
-                'text': self.text(),
+                'text': self.text,
                 'cells': [cell.as_dict() for cell in self.cells]}
 
+    def write_html(self, buf: TextIO):
+        buf.write('<tr>')
+        for index, cell in enumerate(self.cells):
+            if index:
+                buf.write('\n')
+            buf.write(cell.to_html())
+        buf.write('</tr>')
+
     def to_html(self):
-        content = "\n".join([cell.to_html() for cell in self.cells])
-        return wrap_tag('tr', content)
+        return render_html(self)
 
 
 class TableText:
@@ -93,9 +116,16 @@ class TableText:
         return {'kind': 'table',
                 'rows': [row.as_dict() for row in self.rows]}
 
+    def write_html(self, buf: TextIO):
+        buf.write('<table>')
+        for index, row in enumerate(self.rows):
+            if index:
+                buf.write('\n')
+            row.write_html(buf)
+        buf.write('</table>')
+
     def to_html(self):
-        content = "\n".join([row.to_html() for row in self.rows])
-        return wrap_tag('table', content)
+        return render_html(self)
 
 
 class Page:
@@ -111,15 +141,20 @@ class Page:
 
 
 def calculate_box(lines: List[Line]):
-    x0 = min([first_word['x0'] for first_word in
-              [line.words[0] for line in lines if line.words]])
-    bottom = lines[-1].words[0]['bottom']
-    x1 = max([last_word['x1'] for last_word in
-              [line.words[-1] for line in lines if line.words]])
-    top = lines[0].words[0]['top']
+    lines = [line for line in lines if line.words]
+    x0 = min(line.first_x0 for line in lines)
+    bottom = lines[-1].first_bottom
+    x1 = max(line.last_x1 for line in lines)
+    top = lines[0].first_top
     return [x0, bottom, x1, top]
 
 
+def render_html(element) -> str:
+    buf = io.StringIO()
+    element.write_html(buf)
+    return buf.getvalue()
+
+
 def wrap_tag(tag: str, content: str):
     start = f'<{tag}>'
     end = f'</{tag}>'
@@ -130,11 +165,14 @@ class FormattedText:
     def __init__(self, style: str, text: str):
         self.style = style
         self.text = text
+        self._as_dict = None
 
     def as_dict(self):
-        return {'kind': 'text',
-                'style': self.style,
-                'text': self.text}
+        if self._as_dict is None:
+            self._as_dict = {'kind': 'text',
+                             'style': self.style,
+                             'text': self.text}
+        return self._as_dict
 
     def __str__(self):
         return self.text
@@ -158,6 +196,9 @@ class Paragraph:
     def __str__(self):
         return " ".join([t.text for t in self.text])
 
+    def write_html(self, buf: TextIO):
+        buf.write(self.to_html())
+
     def to_html(self):
         return wrap_tag('p', " ".join([text.to_html() for text in self.text]))
 
@@ -177,13 +218,17 @@ class Listing:
             items.append(" ".join(text.text for text in item)[0:30] + "...")
         return str(items)
 
-    def to_html(self):
-        li = []
-        for item in self.items():
-            li.append(" ".join([line.to_html() for line in item]))
+    def write_html(self, buf: TextIO):
         type = 'ol' if self.kind == 'ordered' else 'ul'
-        content = "\n".join([wrap_tag('li', item) for item in li])
-        return wrap_tag(type, content)
+        buf.write(f'<{type}>')
+        for index, item in enumerate(self.items()):
+            if index:
+                buf.write('\n')
+            buf.write(wrap_tag('li', " ".join([line.to_html() for line in item])))
+        buf.write(f'</{type}>')
+
+    def to_html(self):
+        return render_html(self)
 
 
 class Header:
@@ -192,6 +237,7 @@ class Header:
         self.formatted_text = formatted_text
         self.box = box
 
+    @functools.cached_property
     def text(self):
         return " ".join(text.text for text in self.formatted_text)
 
@@ -199,76 +245,118 @@ class Header:
         return {'kind': 'header',
                 'level': self.level,
                 'formatted_text': [t.as_dict() for t in self.formatted_text],
-                'text': self.text(),
+                'text': self.text,
                 'box': self.box}
 
     def __str__(self):
-        return f"{self.level}: {self.text()}"
+        return f"{self.level}: {self.text}"
+
+    def write_html(self, buf: TextIO):
+        buf.write(self.to_html())
 
     def to_html(self):
-        return wrap_tag(self.level, " ".join([text.text for text in self.formatted_text]))
+        return wrap_tag(self.level, self.text)
 
 
 class Document:
     def __init__(self, elements, tables):
         self.elements = elements
         self.tables = tables
+        self._all_elements = None
+        self._by_kind = {'header': [], 'ol': [], 'ul': [], 'p': []}
+        for element in elements:
+            if isinstance(element, Header):
+                self._by_kind['header'].append(element)
+            elif isinstance(element, Listing):
+                self._by_kind['ol' if element.kind == 'ordered' else 'ul'].append(element)
+            elif isinstance(element, Paragraph):
+                self._by_kind['p'].append(element)
 
     def all_elements(self):
-        return sorted(list(itertools.chain(self.elements, self.tables)), key=lambda el: el.box[1])
+        if self._all_elements is None:
+            keyed = [(el.box[1], index, el) for index, el in enumerate([*self.elements, *self.tables])]
+            keyed.sort()
+            self._all_elements = [el for _, _, el in keyed]
+        return self._all_elements
 
     def headers(self):
-        return [el for el in self.elements if isinstance(el, Header)]
+        return self._by_kind['header']
 
     def as_dict(self):
         return {'kind': 'document',
-                'elements': [el.as_dict() for el in self.elements if el.as_dict]}
+                'elements': [el.as_dict() for el in self.elements]}
 
     def ordered_lists(self):
-        return [el for el in self.elements if isinstance(el, Listing) and el.kind == 'ordered']
+        return self._by_kind['ol']
 
     def lists(self):
-        return [el for el in self.elements if isinstance(el, Listing) and el.kind == 'unordered']
+        return self._by_kind['ul']
 
     def paragraphs(self):
-        return [el for el in self.elements if isinstance(el, Paragraph)]
+        return self._by_kind['p']
+
+    def write_html(self, buf: TextIO):
+        for index, element in enumerate(self.all_elements()):
+            if index:
+                buf.write('\n')
+            element.write_html(buf)
 
     def to_html(self) -> str:
-        serialized = []
-        for element in self.all_elements():
-            serialized.append(element.to_html())
-        return "\n".join(serialized)
+        return render_html(self)
 
 
-def fix_word_breaks(lines: List[Line]) -> List[Line]:
-    for index in range(len(lines) - 2):
-        if lines[index].words:
-            last_word = lines[index].words[-1]
-            next_line_word = lines[index + 1].words[0]
+def fix_word_breaks(lines: List[Line]) -> None:
+    for index in range(len(lines) - 1):
+        line, next_line = lines[index], lines[index + 1]
+        if line.words and next_line.words:
+            last_word = line.words[-1]
             if last_word['text'][-1] == '-':
-                last_word['text'] = last_word['text'][0:-2] + next_line_word['text']
-                lines[index + 1].words.remove(next_line_word)
+                last_word['text'] = last_word['text'][:-1] + next_line.words[0]['text']
+                del next_line.words[0]
+                line.refresh_bounds()
+                next_line.refresh_bounds()
 
 
-def is_bold(word: Union[Word, str]):
+BOLD = 1
+ITALIC = 2
+MEDIUM = 4
+
+_FONT_FLAGS: Dict[str, int] = {}
+_FONT_WEIGHTS = {'Black': BOLD, 'Bold': BOLD, 'Italic': ITALIC, 'Medium': MEDIUM}
+_FONT_WEIGHTS_RE = re.compile('|'.join(_FONT_WEIGHTS))
+
+
+def _classify_font(font: str) -> int:
+    flags = 0
+    for weight in _FONT_WEIGHTS_RE.findall(font):
+        flags |= _FONT_WEIGHTS[weight]
+    _FONT_FLAGS[font] = flags
+    return flags
+
+
+def font_flags(word: Union[Word, str]) -> int:
     font = word if isinstance(word, str) else word['fontname']
-    bold = "Black" in font or "Bold" in font
-    return bold
+    flags = _FONT_FLAGS.get(font)
+    return _classify_font(font) if flags is None else flags
+
+
+def is_bold(word: Union[Word, str]):
+    return bool(font_flags(word) & BOLD)
 
 
 def is_italic(word: Union[Word, str]):
-    font = word if isinstance(word, str) else word['fontname']
-    return "Italic" in font
+    return bool(font_flags(word) & ITALIC)
 
 
 def is_medium(word: Union[Word, str]):
-    font = word if isinstance(word, str) else word['fontname']
-    return "Medium" in font
+    return bool(font_flags(word) & MEDIUM)
 
 
+@functools.lru_cache(maxsize=128)
 def font_style(font_name: str):
-    bold = is_bold(font_name) or is_medium(font_name)
-    italic = is_italic(font_name)
+    flags = font_flags(font_name)
+    bold = flags & (BOLD | MEDIUM)
+    italic = flags & ITALIC
     if bold and italic:
         return 'bold-italic'
     elif bold:
@@ -280,10 +368,21 @@ def font_style(font_name: str):
 
 
 def format_text(words: List[Word]) -> List[FormattedText]:
-    words_by_font = itertools.groupby(words, lambda w: w['fontname'])
-    formatted_text = []
-    for font, grouped_words in words_by_font:
-        style = font_style(font)
-        text = " ".join(word['text'] for word in grouped_words)
-        formatted_text.append(FormattedText(style, text))
-    return formatted_text
\ No newline at end of file
+    formatted_text: List[FormattedText] = []
+    current_font: Optional[str] = None
+    current_style = ''
+    texts: List[str] = []
+    for word in words:
+        font = word['fontname']
+        if font != current_font:
+            current_font = font
+            style = font_style(font)
+            if style != current_style:
+                if texts:
+                    formatted_text.append(FormattedText(current_style, " ".join(texts)))
+                current_style = style
+                texts = []
+        texts.append(word['text'])
+    if texts:
+        formatted_text.append(FormattedText(current_style, " ".join(texts)))
+    return formatted_text
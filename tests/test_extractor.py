@@ -0,0 +1,159 @@
+import json
+import os
+
+import pdfplumber
+import yaml
+from pdfplumber.table import Table
+from pytest import fixture
+
+from explobook.extractor import parse_page, extract_page, crop, print_classification, print_image, \
+    within, parse_table, remove_tables, extract, save_pages, save_pages_jsonl
+from explobook import extractor, model
+from explobook.model import Word, Line, Section, Cell, Row, TableText
+
+SAMPLE_LINES = [('F1', 12, 100, 150, 'OBJETIVOS CUMPLIDOS'),
+                ('F2', 9, 100, 180, '- Actuaron con'),
+                ('F2', 9, 100, 190, '- Construyeron'),
+                ('F2', 9, 130, 230, 'En general, los rastreadores')]
+
+
+# a 2x2 table, columns split at x=200 and rows at y=120
+TABLE = Table(None, [(100, 100, 200, 120), (200, 100, 300, 120),
+                     (100, 120, 200, 140), (200, 120, 300, 140)])
+
+
+def word(text: str, x0: float, x1: float, top: float, bottom: float) -> Word:
+    return Word(text=text, fontname='Helvetica', size=9, x0=x0, x1=x1,
+                top=top, bottom=bottom, doctop=top, direction=1, upright=True)
+
+
+def write_pdf(path, lines):
+    content = ''.join(f'BT /{font} {size} Tf {x} {792 - top - size} Td ({text}) Tj ET\n'
+                      for font, size, x, top, text in lines)
+    objects = [
+        '<< /Type /Catalog /Pages 2 0 R >>',
+        '<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+        '/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>',
+        '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>',
+        '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+        f'<< /Length {len(content)} >>\nstream\n{content}endstream',
+    ]
+    pdf = b'%PDF-1.4\n'
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f'{number} 0 obj\n{obj}\nendobj\n'.encode()
+    xref = len(pdf)
+    pdf += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    pdf += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode()
+    pdf += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    path.write_bytes(pdf)
+    return str(path)
+
+
+@fixture
+def sample_pdf(tmp_path):
+    return write_pdf(tmp_path / "sample.pdf", SAMPLE_LINES)
+
+
+@fixture
+def small_page():
+    title = Line([word('Título', 100, 140, 150, 162)])
+    body = Line([word('Texto', 100, 130, 170, 179), word('normal', 135, 170, 170, 179)])
+    cell = Cell([Section([Line([word('celda', 110, 140, 102, 112)])])])
+    return model.Page(7, [Section([title]), Section([body])], [TableText([Row([cell])], (100, 100, 300, 140))])
+
+
+def test_print_classification(sample_pdf, tmp_path):
+    os.makedirs(tmp_path / "debug")
+    with pdfplumber.open(sample_pdf) as pdf:
+        page = pdf.pages[0]
+        document = parse_page(page)
+        assert document.headers() and document.lists() and document.paragraphs()
+        print_classification(crop(page), document, str(tmp_path))
+    assert (tmp_path / "debug" / "001.jpeg").stat().st_size > 0
+
+
+def test_print_image(sample_pdf, tmp_path):
+    with pdfplumber.open(sample_pdf) as pdf:
+        page = pdf.pages[0]
+        print_image(crop(page), extract_page(page), str(tmp_path))
+    assert (tmp_path / "001.jpeg").stat().st_size > 0
+
+
+def test_within_uses_the_word_center():
+    left, right, _, _ = TABLE.cells
+    crossing = word('cruza', 185, 225, 102, 112)
+    assert not within(crossing, left)
+    assert within(crossing, right)
+
+
+def test_within_puts_shared_edges_in_the_next_cell():
+    left, right, bottom_left, _ = TABLE.cells
+    on_column_edge = word('borde', 190, 210, 102, 112)
+    assert not within(on_column_edge, left)
+    assert within(on_column_edge, right)
+    on_row_edge = word('borde', 110, 150, 115, 125)
+    assert not within(on_row_edge, left)
+    assert within(on_row_edge, bottom_left)
+
+
+def test_parse_table_assigns_words_to_cells():
+    words = [word('uno', 110, 150, 102, 112), word('dos', 185, 225, 102, 112),
+             word('tres', 110, 150, 122, 132), word('cuatro', 250, 290, 115, 125),
+             word('fuera', 310, 350, 102, 112)]
+    table = parse_table(TABLE, words)
+    assert [[cell.text for cell in row.cells] for row in table.rows] == [['uno', 'dos'], ['tres', 'cuatro']]
+    assert table.box == (100, 100, 300, 140)
+
+
+def test_remove_tables_keeps_words_centered_outside():
+    inside = word('dentro', 150, 170, 102, 112)
+    straddling_in = word('mitad', 280, 310, 102, 112)
+    straddling_out = word('afuera', 290, 320, 102, 112)
+    on_bottom_edge = word('texto', 110, 150, 135, 145)
+    words = [inside, straddling_in, straddling_out, on_bottom_edge]
+    assert remove_tables(words, [TABLE]) == [straddling_out, on_bottom_edge]
+    assert remove_tables(words, []) == words
+
+
+def test_save_pages_round_trip(small_page, tmp_path):
+    save_pages([small_page, small_page], str(tmp_path))
+    with open(tmp_path / "pages.yaml") as file:
+        assert list(yaml.safe_load_all(file)) == [small_page.as_dict(), small_page.as_dict()]
+
+
+def test_extract_dumps_pages(sample_pdf, tmp_path):
+    extract(sample_pdf, str(tmp_path), dump='yaml')
+    with open(tmp_path / "pages.yaml") as file:
+        pages = list(yaml.safe_load_all(file))
+    assert [page['number'] for page in pages] == [1]
+    assert pages[0]['sections'][0]['text'] == 'OBJETIVOS CUMPLIDOS'
+
+
+def test_save_pages_jsonl_round_trip(small_page, tmp_path):
+    save_pages_jsonl([small_page, small_page], str(tmp_path))
+    with open(tmp_path / "pages.jsonl") as file:
+        assert [json.loads(line) for line in file] == [small_page.as_dict(), small_page.as_dict()]
+
+
+def test_extract_dumps_pages_as_json_lines(sample_pdf, tmp_path):
+    extract(sample_pdf, str(tmp_path), dump='jsonl')
+    with open(tmp_path / "pages.jsonl") as file:
+        pages = [json.loads(line) for line in file]
+    assert [page['number'] for page in pages] == [1]
+
+
+def test_extract_single_page_skips_the_pool(sample_pdf, tmp_path, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("a single page should be extracted in process")
+    monkeypatch.setattr(extractor, 'ProcessPoolExecutor', no_pool)
+    extract(sample_pdf, str(tmp_path), [0])
+    assert (tmp_path / "00-objetivos-cumplidos.html").exists()
+
+
+def test_extract_pages_in_a_pool(sample_pdf, tmp_path):
+    extract(sample_pdf, str(tmp_path), [0, 0], dump='jsonl')
+    with open(tmp_path / "pages.jsonl") as file:
+        assert [json.loads(line)['number'] for line in file] == [1, 1]
@@ -0,0 +1,73 @@
+from explobook import classifier
+from explobook.classifier import classify_lines
+from explobook.model import Line, Word, Document, Section, Cell, Row, calculate_box, \
+    fix_word_breaks
+
+
+def word(text: str, x0: float, top: float) -> Word:
+    return Word(text=text, fontname='Helvetica', size=9, x0=x0, x1=x0 + 10 * len(text),
+                top=top, bottom=top + 10, doctop=top, direction=1, upright=True)
+
+
+def line(*texts: str, x0: float = 90, top: float = 0) -> Line:
+    words = []
+    for text in texts:
+        words.append(word(text, x0, top))
+        x0 += 10 * len(text) + 5
+    return Line(words)
+
+
+def test_fix_word_breaks_drops_only_the_hyphen():
+    lines = [line('Primer', 'construc-'), line('ción', 'cruzada', top=12)]
+    fix_word_breaks(lines)
+    assert lines[0].text == 'Primer construcción'
+    assert lines[1].text == 'cruzada'
+    assert lines[1].first_x0 == lines[1].words[0]['x0']
+
+
+def test_fix_word_breaks_joins_into_the_last_line():
+    lines = [line('Una', 'línea'), line('otra', 'pala-', top=12), line('bra', top=24)]
+    fix_word_breaks(lines)
+    assert lines[1].text == 'otra palabra'
+    assert lines[2].words == []
+    assert lines[2].first_word is None
+
+
+def test_fix_word_breaks_skips_empty_lines():
+    lines = [line('pala-'), line('bra', top=12), line('final', top=24)]
+    fix_word_breaks(lines)
+    fix_word_breaks(lines)
+    assert [ln.text for ln in lines] == ['palabra', '', 'final']
+
+
+def test_calculate_box_ignores_empty_lines():
+    lines = [line('Primer', top=0), line('final', top=12), Line([])]
+    assert calculate_box(lines) == [90, 22, 150, 0]
+
+
+def test_list_with_emptied_last_line_keeps_its_box():
+    lines = [line('-', 'Primer', 'construc-'), line('ción', top=12)]
+    listing, = classify_lines(lines)
+    assert listing.box == [90, 22, 260, 0]
+    assert listing.items()[0][0].text == '- Primer construcción'
+    assert Document([listing], []).to_html() == '<ul><li>- Primer construcción</li></ul>'
+
+
+def test_cell_text_follows_word_break_fixes():
+    cell = Cell([Section([line('pala-'), line('bra', 'final', top=12)])])
+    row = Row([cell])
+    assert row.text == 'pala- bra final'
+    cell.to_html()
+    assert cell.text == 'palabra final'
+    assert row.as_dict()['text'] == 'palabra final'
+
+
+def test_classify_lines_checks_each_line_start_once(monkeypatch):
+    calls = []
+    is_ol = classifier._is_ol
+    monkeypatch.setattr(classifier, '_is_ol', lambda text: calls.append(text) or is_ol(text))
+    lines = [line('Texto'), line('1.', 'Uno', top=12), line('Mas', top=24),
+             line('2.', 'Dos', top=36), line('Fin', top=48)]
+    elements = classify_lines(lines)
+    assert [type(element).__name__ for element in elements] == ['Paragraph', 'Listing']
+    assert len(calls) == len(lines)